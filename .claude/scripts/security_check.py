@@ -23,17 +23,19 @@ new_string = input_data.get('tool_input', {}).get('new_string', '')
 # Combine content for checking
 text_to_check = content or new_string or ''
 
-# Sensitive file patterns - BLOCK these
-BLOCKED_PATHS = [
-    r'\.env\.production$',
-    r'\.env\.local$',
-    r'/secrets/',
-    r'credentials\.json$',
-    r'\.pem$',
-    r'\.key$',
-    r'id_rsa',
-    r'\.aws/credentials',
-]
+# Sensitive file patterns - BLOCK these (matched against the lowercased path)
+BLOCKED_SUFFIXES = (
+    '.env.production',
+    '.env.local',
+    'credentials.json',
+    '.pem',
+    '.key',
+)
+BLOCKED_SUBSTRINGS = (
+    '/secrets/',
+    'id_rsa',
+    '.aws/credentials',
+)
 
 # Sensitive content patterns - WARN about these
 SENSITIVE_PATTERNS = [
@@ -44,19 +46,21 @@ SENSITIVE_PATTERNS = [
     (r'sk-[a-zA-Z0-9]{20,}', 'OpenAI API key pattern detected'),
     (r'ghp_[a-zA-Z0-9]{36}', 'GitHub token pattern detected'),
     (r'xox[baprs]-[a-zA-Z0-9-]+', 'Slack token pattern detected'),
+    (r'eyJ[A-Za-z0-9_-]{20,}\.[A-Za-z0-9_-]{20,}\.[A-Za-z0-9_-]{20,}', 'JWT token detected'),
 ]
 
+# Compiled once at import. Each pattern is searched on its own so overlapping
+# findings (e.g. a provider key assigned to api_key) are all reported
+SENSITIVE_REGEXES = [(re.compile(pattern, re.IGNORECASE), message) for pattern, message in SENSITIVE_PATTERNS]
+
 # Check blocked paths
-for pattern in BLOCKED_PATHS:
-    if re.search(pattern, file_path, re.IGNORECASE):
-        print(f"🚫 BLOCKED: Cannot write to sensitive file: {file_path}", file=sys.stderr)
-        sys.exit(2)  # Block the operation
+path_lower = file_path.lower()
+if path_lower.endswith(BLOCKED_SUFFIXES) or any(part in path_lower for part in BLOCKED_SUBSTRINGS):
+    print(f"🚫 BLOCKED: Cannot write to sensitive file: {file_path}", file=sys.stderr)
+    sys.exit(2)  # Block the operation
 
 # Check for sensitive content (warn but don't block)
-warnings = []
-for pattern, message in SENSITIVE_PATTERNS:
-    if re.search(pattern, text_to_check, re.IGNORECASE):
-        warnings.append(message)
+warnings = [message for regex, message in SENSITIVE_REGEXES if regex.search(text_to_check)]
 
 if warnings:
     print("⚠️ Security warnings:", file=sys.stderr)
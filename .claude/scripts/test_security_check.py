@@ -0,0 +1,64 @@
+"""
+Tests for security_check.py.
+Run with: python -m pytest .claude/scripts/test_security_check.py
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+SCRIPT = Path(__file__).with_name('security_check.py')
+
+# Fake credentials, assembled at runtime so this file doesn't trip the scan itself
+OPENAI_KEY = 'sk-' + 'a1B2c3D4' * 4
+JWT = '.'.join(['eyJ' + 'hbGciOiJIUzI1NiJ9abc', 'eyJzdWIiOiIxMjM0NTY3ODkwIn0', 'SflKxwRJSMeKKF2QT4fwpMeJf36POk6yJV'])
+
+
+def run_check(content, file_path='src/config.ts'):
+    """Feed a Write tool payload to the hook; return (exit code, stderr)."""
+    payload = {'tool_input': {'file_path': file_path, 'content': content}}
+    result = subprocess.run(
+        [sys.executable, str(SCRIPT)],
+        input=json.dumps(payload),
+        capture_output=True,
+        text=True,
+    )
+    return result.returncode, result.stderr
+
+
+def test_assigned_provider_key_reports_both_warnings():
+    code, stderr = run_check(f'api_key = "{OPENAI_KEY}"')
+    assert code == 0
+    assert 'Hardcoded API key detected' in stderr
+    assert 'OpenAI API key pattern detected' in stderr
+
+
+def test_assigned_jwt_reports_both_warnings():
+    for field, warning in (('secret', 'Hardcoded secret detected'),
+                           ('password', 'Hardcoded password detected'),
+                           ('api_key', 'Hardcoded API key detected')):
+        code, stderr = run_check(f'{field}: "{JWT}"')
+        assert code == 0
+        assert warning in stderr, field
+        assert 'JWT token detected' in stderr, field
+
+
+def test_jwt_without_field_pattern_is_flagged():
+    # No assignment pattern covers `token`, so the JWT pattern alone must fire
+    for content in (f'token = "{JWT}"', f'const auth = `Bearer {JWT}`'):
+        code, stderr = run_check(content)
+        assert code == 0
+        assert 'JWT token detected' in stderr, content
+
+
+def test_clean_content_has_no_warnings():
+    code, stderr = run_check('const apiKey = process.env.OPENAI_API_KEY')
+    assert code == 0
+    assert stderr == ''
+
+
+def test_blocked_path_exits_2():
+    code, stderr = run_check('TOKEN=abc', file_path='app/.env.local')
+    assert code == 2
+    assert 'BLOCKED' in stderr
@@ -246,6 +246,11 @@ export function getAvailableProvider(): 'jina' | 'cohere' | 'keyword' {
   return 'keyword';
 }
 
+/**
+ * Common words ignored by keyword reranking
+ */
+const RERANK_STOP_WORDS = new Set(['the', 'a', 'an', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'shall', 'can', 'need', 'dare', 'ought', 'used', 'to', 'of', 'in', 'for', 'on', 'with', 'at', 'by', 'from', 'as', 'into', 'through', 'during', 'before', 'after', 'above', 'below', 'between', 'under', 'again', 'further', 'then', 'once', 'here', 'there', 'when', 'where', 'why', 'how', 'all', 'each', 'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than', 'too', 'very', 's', 't', 'just', 'don', 'now', 'what', 'which', 'who', 'this', 'that', 'these', 'those', 'am', 'it', 'its', 'and', 'but', 'if', 'or', 'because', 'until', 'while', 'about']);
+
 /**
  * Simple keyword-based reranking fallback (no API required)
  * Uses TF-IDF-like scoring based on query term overlap
@@ -256,11 +261,12 @@ export function keywordRerank(
   topK: number = 5
 ): RerankedSource[] {
   // Extract query terms (lowercase, remove common words)
-  const stopWords = new Set(['the', 'a', 'an', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'shall', 'can', 'need', 'dare', 'ought', 'used', 'to', 'of', 'in', 'for', 'on', 'with', 'at', 'by', 'from', 'as', 'into', 'through', 'during', 'before', 'after', 'above', 'below', 'between', 'under', 'again', 'further', 'then', 'once', 'here', 'there', 'when', 'where', 'why', 'how', 'all', 'each', 'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than', 'too', 'very', 's', 't', 'just', 'don', 'now', 'what', 'which', 'who', 'this', 'that', 'these', 'those', 'am', 'it', 'its', 'and', 'but', 'if', 'or', 'because', 'until', 'while', 'about']);
-
   const queryTerms = query.toLowerCase()
     .split(/\W+/)
-    .filter(t => t.length > 2 && !stopWords.has(t));
+    .filter(t => t.length > 2 && !RERANK_STOP_WORDS.has(t));
+
+  // Compile one word-boundary pattern per term, shared across all sources
+  const termPatterns = queryTerms.map(term => new RegExp(`\\b${term}\\b`, 'gi'));
 
   // Score each source
   const scored = sources.map((source, index) => {
@@ -268,9 +274,8 @@ export function keywordRerank(
 
     // Count term occurrences
     let score = 0;
-    for (const term of queryTerms) {
-      const regex = new RegExp(`\\b${term}\\b`, 'gi');
-      const matches = text.match(regex);
+    for (const pattern of termPatterns) {
+      const matches = text.match(pattern);
       if (matches) {
         score += matches.length;
       }
@@ -29,8 +29,15 @@ function getOpenAI(): OpenAI {
 
 /**
  * Extract JSON from LLM response
+ * Tries a direct parse first (JSON mode responses), then strips fences/cleans up
  */
 function extractJSON(content: string): any {
+  try {
+    return JSON.parse(content);
+  } catch {
+    // Not bare JSON - fall through to the tolerant path
+  }
+
   try {
     let jsonContent = content;
     if (content.includes('```json')) {
@@ -160,6 +167,7 @@ export async function retrieveFromTree(
     model,
     messages: [{ role: 'user', content: prompt }],
     temperature: 0,
+    response_format: { type: 'json_object' },
   });
 
   const rawResponse = response.choices[0].message.content || '';
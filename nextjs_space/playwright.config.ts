@@ -2,6 +2,7 @@ import { defineConfig, devices } from '@playwright/test'
 
 export default defineConfig({
   testDir: './tests',
+  testIgnore: 'unit/**', // Node-only specs run via playwright.unit.config.ts
   fullyParallel: false, // Run tests sequentially for RAG evaluation
   forbidOnly: !!process.env.CI,
   retries: 0,
@@ -0,0 +1,8 @@
+import { defineConfig } from '@playwright/test'
+
+// Node-only unit specs: no browser project and no webServer, so the dev server isn't started
+export default defineConfig({
+  testDir: './tests/unit',
+  reporter: 'list',
+  timeout: 30000,
+})
@@ -68,13 +68,12 @@ function getTestQuestions() {
   return questions;
 }
 
-// Check keywords in response
-function checkKeywords(response, expectedKeywords) {
+// Check keywords in response (expects the response already lowercased)
+function checkKeywords(lowerResponse, expectedKeywords) {
   if (!expectedKeywords || expectedKeywords.length === 0) {
     return { found: [], missing: [], accuracy: 1 };
   }
 
-  const lowerResponse = response.toLowerCase();
   const found = [];
   const missing = [];
 
@@ -96,10 +95,9 @@ function checkKeywords(response, expectedKeywords) {
   };
 }
 
-// Check article references
-function checkArticles(response, expectedArticles) {
+// Check article references (expects the response already lowercased)
+function checkArticles(lowerResponse, expectedArticles) {
   if (!expectedArticles || expectedArticles.length === 0) return true;
-  const lowerResponse = response.toLowerCase();
   return expectedArticles.some(article => lowerResponse.includes(article.toLowerCase()));
 }
 
@@ -130,12 +128,15 @@ async function processQuestion(question, pipelineConfig, pipelineName) {
     const data = await sendQuery(question.query, pipelineConfig);
     const duration = Date.now() - queryStart;
 
+    // Lowercase once; both checks scan the same text
+    const lowerResponse = (data.response || '').toLowerCase();
+
     // Check keywords
-    const keywordCheck = checkKeywords(data.response, question.expected_keywords);
+    const keywordCheck = checkKeywords(lowerResponse, question.expected_keywords);
     const isPassed = keywordCheck.accuracy >= 0.5 || question.expected_keywords.length === 0;
 
     // Check article matches
-    const articleMatch = checkArticles(data.response, question.expected_articles);
+    const articleMatch = checkArticles(lowerResponse, question.expected_articles);
 
     // Track cost
     const queryCost = data.cost?.total || 0;
@@ -303,9 +304,10 @@ function generateComparisonReport(pipelineResults, startTime) {
     comparison.questionComparison.push(questionData);
   }
 
-  // Save JSON report
+  // Save JSON report (serialized once, also written as latest below)
   const jsonPath = path.join(reportDir, `pipeline-comparison-${timestamp}.json`);
-  fs.writeFileSync(jsonPath, JSON.stringify(comparison, null, 2));
+  const comparisonJson = JSON.stringify(comparison, null, 2);
+  fs.writeFileSync(jsonPath, comparisonJson);
 
   // Generate markdown report
   let md = `# Pipeline Comparison Report (PARALLEL)
@@ -376,7 +378,7 @@ function generateComparisonReport(pipelineResults, startTime) {
   fs.writeFileSync(mdPath, md);
 
   // Save as latest
-  fs.writeFileSync(path.join(reportDir, 'latest-comparison.json'), JSON.stringify(comparison, null, 2));
+  fs.writeFileSync(path.join(reportDir, 'latest-comparison.json'), comparisonJson);
   fs.writeFileSync(path.join(reportDir, 'latest-comparison.md'), md);
 
   // Generate CSV with answers for all pipelines
@@ -98,6 +98,7 @@ interface TestResult {
     sectionMatches: string[];
   };
   error?: string;
+  cached?: boolean; // Response reused from an identical query earlier in the run; its timings are not a new sample
 }
 
 interface ModelSummary {
@@ -165,6 +166,23 @@ async function runQuery(
   };
 }
 
+// Responses requested this run, keyed by model + query text. A dataset may repeat
+// a query under different ids/criteria; each distinct one is sent once per model
+const queryResponses = new Map<string, ReturnType<typeof runQuery>>();
+
+function runQueryOnce(query: string, model: string): { pending: ReturnType<typeof runQuery>; reused: boolean } {
+  const key = `${model}\u0000${query}`;
+  const existing = queryResponses.get(key);
+  if (existing) return { pending: existing, reused: true };
+
+  const pending = runQuery(query, model).catch(error => {
+    queryResponses.delete(key); // Let a later duplicate try again
+    throw error;
+  });
+  queryResponses.set(key, pending);
+  return { pending, reused: false };
+}
+
 // Evaluate response against ground truth
 function evaluateResponse(
   question: TestQuestion,
@@ -174,41 +192,48 @@ function evaluateResponse(
 ): Omit<TestResult['metrics'], 'totalTimeMs' | 'ragTimeMs' | 'llmTimeMs' | 'retrievalConfidence' | 'sourcesRetrieved'> & TestResult['evaluation'] {
   const responseLower = response.toLowerCase();
 
-  // Must contain evaluation
+  // The keyword lists overlap (must/should/expected), so scan each distinct
+  // keyword once per response and share the hit across every check below
+  const responseHits = new Map<string, boolean>();
+  const inResponse = (kw: string): boolean => {
+    const key = kw.toLowerCase();
+    let hit = responseHits.get(key);
+    if (hit === undefined) {
+      hit = responseLower.includes(key);
+      responseHits.set(key, hit);
+    }
+    return hit;
+  };
+
+  // Must contain evaluation (one scan per keyword, split into matches/missing)
   const mustContain = question.evaluation_criteria.must_contain || [];
-  const mustContainMatches = mustContain.filter(kw =>
-    responseLower.includes(kw.toLowerCase())
-  );
-  const mustContainMissing = mustContain.filter(kw =>
-    !responseLower.includes(kw.toLowerCase())
-  );
+  const mustContainMatches: string[] = [];
+  const mustContainMissing: string[] = [];
+  for (const kw of mustContain) {
+    (inResponse(kw) ? mustContainMatches : mustContainMissing).push(kw);
+  }
 
   // Should contain evaluation
   const shouldContain = question.evaluation_criteria.should_contain || [];
-  const shouldContainMatches = shouldContain.filter(kw =>
-    responseLower.includes(kw.toLowerCase())
-  );
+  const shouldContainMatches = shouldContain.filter(inResponse);
 
   // Must not contain evaluation
   const mustNotContain = question.evaluation_criteria.must_not_contain || [];
-  const mustNotContainViolations = mustNotContain.filter(kw =>
-    responseLower.includes(kw.toLowerCase())
-  );
+  const mustNotContainViolations = mustNotContain.filter(inResponse);
 
-  // Article matching in sources
+  // Article matching in sources (the combined text already includes every
+  // section path, so one scan per article covers both)
   const sourceContent = sources.map(s =>
     `${s.sectionPath || ''} ${s.content || ''}`.toLowerCase()
   ).join(' ');
 
   const articleMatches = question.expected_articles.filter(article =>
-    sourceContent.includes(article.toLowerCase()) ||
-    sources.some(s => s.sectionPath?.toLowerCase().includes(article.toLowerCase()))
+    sourceContent.includes(article.toLowerCase())
   );
 
   // Section matching in sources
   const sectionMatches = question.expected_sections.filter(section =>
-    sourceContent.includes(section.toLowerCase()) ||
-    sources.some(s => s.sectionPath?.toLowerCase().includes(section.toLowerCase()))
+    sourceContent.includes(section.toLowerCase())
   );
 
   // Citation analysis
@@ -237,9 +262,7 @@ function evaluateResponse(
     : (sources.length > 0 ? 1 : 0);
 
   // Keyword accuracy (from expected_keywords)
-  const keywordMatches = question.expected_keywords.filter(kw =>
-    responseLower.includes(kw.toLowerCase())
-  );
+  const keywordMatches = question.expected_keywords.filter(inResponse);
   const keywordAccuracy = question.expected_keywords.length > 0
     ? keywordMatches.length / question.expected_keywords.length
     : 1;
@@ -305,7 +328,8 @@ async function runTest(
 ): Promise<TestResult> {
   try {
     // Run the query using test endpoint (no session needed)
-    const { response, sources, metrics } = await runQuery(question.query, model);
+    const { pending, reused } = runQueryOnce(question.query, model);
+    const { response, sources, metrics } = await pending;
 
     // Evaluate the response
     const evaluation = evaluateResponse(question, response, sources, scoring);
@@ -333,6 +357,7 @@ async function runTest(
         articleMatches: evaluation.articleMatches,
         sectionMatches: evaluation.sectionMatches,
       },
+      ...(reused && { cached: true }),
     };
   } catch (error) {
     return {
@@ -381,6 +406,29 @@ async function runTest(
   }
 }
 
+// Load results appended by an earlier, interrupted run (errored ones are retried)
+export function loadPartialResults(filePath: string): TestResult[] {
+  if (!fs.existsSync(filePath)) return [];
+
+  const results: TestResult[] = [];
+  for (const line of fs.readFileSync(filePath, 'utf-8').split('\n')) {
+    if (!line.trim()) continue;
+    try {
+      const result: TestResult = JSON.parse(line);
+      if (!result.error) results.push(result);
+    } catch {
+      // Line cut short by the interruption - rerun that test
+    }
+  }
+  return results;
+}
+
+// Questions a model still has to run, skipping (model, question) pairs already in results
+export function pendingQuestions(questions: TestQuestion[], model: string, results: TestResult[]): TestQuestion[] {
+  const done = new Set(results.filter(r => r.model === model).map(r => r.questionId));
+  return questions.filter(q => !done.has(q.id));
+}
+
 // Delay utility
 function delay(ms: number): Promise<void> {
   return new Promise(resolve => setTimeout(resolve, ms));
@@ -388,50 +436,71 @@ function delay(ms: number): Promise<void> {
 
 // Calculate model summary
 function calculateModelSummary(results: TestResult[], model: string, categories: TestDataset['categories']): ModelSummary {
-  const modelResults = results.filter(r => r.model === model);
-  const successfulResults = modelResults.filter(r => !r.error && r.metrics.totalScore > 0);
+  // Single pass: overall sums plus per-category count/score/successes
+  let count = 0;
+  let successful = 0;
+  let timed = 0; // Rows with their own request; reused responses would repeat a sample
+  let totalTime = 0;
+  let ragTime = 0;
+  let llmTime = 0;
+  let retrievalScore = 0;
+  let generationScore = 0;
+  let citationScore = 0;
+  let totalScore = 0;
+
+  const categorySums: Record<string, { count: number; score: number; successful: number }> = {};
+  for (const cat of Object.keys(categories)) {
+    categorySums[cat] = { count: 0, score: 0, successful: 0 };
+  }
 
-  const categoryBreakdown: ModelSummary['categoryBreakdown'] = {};
+  for (const r of results) {
+    if (r.model !== model) continue;
+    const isSuccess = !r.error && r.metrics.totalScore > 0;
+
+    count++;
+    if (isSuccess) successful++;
+    if (!r.cached) {
+      timed++;
+      totalTime += r.metrics.totalTimeMs;
+      ragTime += r.metrics.ragTimeMs;
+      llmTime += r.metrics.llmTimeMs;
+    }
+    retrievalScore += r.metrics.retrievalScore;
+    generationScore += r.metrics.generationScore;
+    citationScore += r.metrics.citationScore;
+    totalScore += r.metrics.totalScore;
+
+    const cat = categorySums[r.category];
+    if (cat) {
+      cat.count++;
+      cat.score += r.metrics.totalScore;
+      if (isSuccess) cat.successful++;
+    }
+  }
 
-  for (const cat of Object.keys(categories)) {
-    const catResults = modelResults.filter(r => r.category === cat);
-    const catSuccessful = catResults.filter(r => !r.error && r.metrics.totalScore > 0);
+  const categoryBreakdown: ModelSummary['categoryBreakdown'] = {};
+  for (const [cat, sums] of Object.entries(categorySums)) {
     categoryBreakdown[cat] = {
-      count: catResults.length,
-      avgScore: catResults.length > 0
-        ? catResults.reduce((sum, r) => sum + r.metrics.totalScore, 0) / catResults.length
-        : 0,
-      successRate: catResults.length > 0
-        ? catSuccessful.length / catResults.length
-        : 0,
+      count: sums.count,
+      avgScore: sums.count > 0 ? sums.score / sums.count : 0,
+      successRate: sums.count > 0 ? sums.successful / sums.count : 0,
     };
   }
 
+  const avg = (sum: number) => count > 0 ? sum / count : 0;
+  const avgTime = (sum: number) => timed > 0 ? sum / timed : 0;
+
   return {
     model,
-    totalQuestions: modelResults.length,
-    successRate: modelResults.length > 0 ? successfulResults.length / modelResults.length : 0,
-    avgTotalTime: modelResults.length > 0
-      ? modelResults.reduce((sum, r) => sum + r.metrics.totalTimeMs, 0) / modelResults.length
-      : 0,
-    avgRagTime: modelResults.length > 0
-      ? modelResults.reduce((sum, r) => sum + r.metrics.ragTimeMs, 0) / modelResults.length
-      : 0,
-    avgLlmTime: modelResults.length > 0
-      ? modelResults.reduce((sum, r) => sum + r.metrics.llmTimeMs, 0) / modelResults.length
-      : 0,
-    avgRetrievalScore: modelResults.length > 0
-      ? modelResults.reduce((sum, r) => sum + r.metrics.retrievalScore, 0) / modelResults.length
-      : 0,
-    avgGenerationScore: modelResults.length > 0
-      ? modelResults.reduce((sum, r) => sum + r.metrics.generationScore, 0) / modelResults.length
-      : 0,
-    avgCitationScore: modelResults.length > 0
-      ? modelResults.reduce((sum, r) => sum + r.metrics.citationScore, 0) / modelResults.length
-      : 0,
-    avgTotalScore: modelResults.length > 0
-      ? modelResults.reduce((sum, r) => sum + r.metrics.totalScore, 0) / modelResults.length
-      : 0,
+    totalQuestions: count,
+    successRate: avg(successful),
+    avgTotalTime: avgTime(totalTime),
+    avgRagTime: avgTime(ragTime),
+    avgLlmTime: avgTime(llmTime),
+    avgRetrievalScore: avg(retrievalScore),
+    avgGenerationScore: avg(generationScore),
+    avgCitationScore: avg(citationScore),
+    avgTotalScore: avg(totalScore),
     categoryBreakdown,
   };
 }
@@ -514,7 +583,7 @@ Generated: ${timestamp}
         const shouldCheck = r.metrics.shouldContainTotal > 0
           ? `${r.metrics.shouldContainScore}/${r.metrics.shouldContainTotal}`
           : 'N/A';
-        report += `| ${r.model} | ${r.metrics.totalScore.toFixed(1)} | ${r.metrics.retrievalScore.toFixed(1)} | ${r.metrics.generationScore.toFixed(1)} | ${r.metrics.citationScore.toFixed(1)} | ${mustCheck} | ${shouldCheck} | ${(r.metrics.totalTimeMs / 1000).toFixed(1)}s |\n`;
+        report += `| ${r.model} | ${r.metrics.totalScore.toFixed(1)} | ${r.metrics.retrievalScore.toFixed(1)} | ${r.metrics.generationScore.toFixed(1)} | ${r.metrics.citationScore.toFixed(1)} | ${mustCheck} | ${shouldCheck} | ${(r.metrics.totalTimeMs / 1000).toFixed(1)}s${r.cached ? ' (reused)' : ''} |\n`;
       }
 
       report += `\n`;
@@ -585,6 +654,22 @@ Based on the test results, here are the recommended improvements:
   return report;
 }
 
+// Write raw results without building one string for the whole file:
+// summaries are small, results (with full source text) are written one per line
+function writeResults(filePath: string, summaries: ModelSummary[], results: TestResult[]): void {
+  const fd = fs.openSync(filePath, 'w');
+  try {
+    const headerJson = JSON.stringify({ summaries }, null, 2);
+    fs.writeSync(fd, headerJson.slice(0, -2) + ',\n  "results": [\n');
+    results.forEach((r, i) => {
+      fs.writeSync(fd, '    ' + JSON.stringify(r) + (i < results.length - 1 ? ',\n' : '\n'));
+    });
+    fs.writeSync(fd, '  ]\n}\n');
+  } finally {
+    fs.closeSync(fd);
+  }
+}
+
 // Main function
 async function main() {
   console.log('=' .repeat(80));
@@ -617,9 +702,29 @@ async function main() {
 
   console.log(`🤖 Testing models: ${testModels.join(', ')}\n`);
 
-  const allResults: TestResult[] = [];
+  // Each result is appended as it completes, so an interrupted run can pick up
+  // where it stopped with --resume instead of repeating every query
+  const partialPath = path.join(__dirname, '../tests/accuracy-results-partial.jsonl');
+  const resume = process.argv.includes('--resume');
+  if (!resume && !process.argv.includes('--fresh') && fs.existsSync(partialPath) && fs.statSync(partialPath).size > 0) {
+    console.error(`❌ ${partialPath} holds results from an interrupted run`);
+    console.error('   Pass --resume to continue it, or --fresh to discard it and start over');
+    process.exit(1);
+  }
+
+  const modelIds = new Set<string>(testModels);
+  const questionIds = new Set(questions.map(q => q.id));
+  const allResults: TestResult[] = resume
+    ? loadPartialResults(partialPath).filter(r => modelIds.has(r.model) && questionIds.has(r.questionId))
+    : [];
+  fs.writeFileSync(partialPath, allResults.map(r => JSON.stringify(r) + '\n').join(''));
+
+  if (allResults.length > 0) {
+    console.log(`♻️  Resuming: ${allResults.length} results loaded from ${partialPath}\n`);
+  }
+
   const totalTests = questions.length * testModels.length;
-  let completed = 0;
+  let completed = allResults.length;
 
   // Run tests for each model
   for (const model of testModels) {
@@ -627,16 +732,19 @@ async function main() {
     console.log(`Testing Model: ${model}`);
     console.log(`${'='.repeat(60)}\n`);
 
+    const pending = pendingQuestions(questions, model, allResults);
+
     // Process in batches
-    for (let i = 0; i < questions.length; i += BATCH_SIZE) {
-      const batch = questions.slice(i, i + BATCH_SIZE);
+    for (let i = 0; i < pending.length; i += BATCH_SIZE) {
+      const batch = pending.slice(i, i + BATCH_SIZE);
 
       const batchPromises = batch.map(async (q) => {
         const result = await runTest(q, model, dataset.scoring);
+        fs.appendFileSync(partialPath, JSON.stringify(result) + '\n');
         completed++;
 
         const status = result.error ? '❌' : (result.metrics.totalScore > 0 ? '✅' : '⚠️');
-        console.log(`${status} [${completed}/${totalTests}] ${model} | ${q.id}: Score ${result.metrics.totalScore.toFixed(1)} (${(result.metrics.totalTimeMs / 1000).toFixed(1)}s)`);
+        console.log(`${status} [${completed}/${totalTests}] ${model} | ${q.id}: Score ${result.metrics.totalScore.toFixed(1)} (${(result.metrics.totalTimeMs / 1000).toFixed(1)}s${result.cached ? ', reused' : ''})`);
 
         return result;
       });
@@ -645,7 +753,7 @@ async function main() {
       allResults.push(...batchResults);
 
       // Delay between batches
-      if (i + BATCH_SIZE < questions.length) {
+      if (i + BATCH_SIZE < pending.length) {
         await delay(DELAY_BETWEEN_BATCHES);
       }
     }
@@ -664,8 +772,9 @@ async function main() {
 
   // Save raw results as JSON
   const resultsPath = path.join(__dirname, `../tests/accuracy-results-${new Date().toISOString().split('T')[0]}.json`);
-  fs.writeFileSync(resultsPath, JSON.stringify({ summaries, results: allResults }, null, 2));
+  writeResults(resultsPath, summaries, allResults);
   console.log(`📊 Raw results saved to: ${resultsPath}`);
+  fs.rmSync(partialPath, { force: true });
 
   // Print summary to console
   console.log('\n' + '=' .repeat(80));
@@ -685,4 +794,7 @@ async function main() {
   console.log(`\n🏆 RECOMMENDED MODEL: ${bestModel.model} (Score: ${bestModel.avgTotalScore.toFixed(1)})`);
 }
 
-main().catch(console.error);
+// Run only when executed directly, so tests can import the helpers above
+if (require.main === module) {
+  main().catch(console.error);
+}
@@ -78,13 +78,12 @@ function getTestQuestions() {
   return questions;
 }
 
-// Check keywords in response
-function checkKeywords(response, expectedKeywords) {
+// Check keywords in response (expects the response already lowercased)
+function checkKeywords(lowerResponse, expectedKeywords) {
   if (!expectedKeywords || expectedKeywords.length === 0) {
     return { found: [], missing: [], accuracy: 1 };
   }
 
-  const lowerResponse = response.toLowerCase();
   const found = [];
   const missing = [];
 
@@ -107,11 +106,10 @@ function checkKeywords(response, expectedKeywords) {
   };
 }
 
-// Check article references
-function checkArticles(response, expectedArticles) {
+// Check article references (expects the response already lowercased)
+function checkArticles(lowerResponse, expectedArticles) {
   if (!expectedArticles || expectedArticles.length === 0) return true;
 
-  const lowerResponse = response.toLowerCase();
   return expectedArticles.some(article =>
     lowerResponse.includes(article.toLowerCase())
   );
@@ -227,9 +225,10 @@ function generateReport(results, startTime) {
     })),
   };
 
-  // Save JSON report
+  // Save JSON report (serialized once, also written as latest below)
   const jsonPath = path.join(reportDir, `accuracy-report-${timestamp}.json`);
-  fs.writeFileSync(jsonPath, JSON.stringify(report, null, 2));
+  const reportJson = JSON.stringify(report, null, 2);
+  fs.writeFileSync(jsonPath, reportJson);
 
   // Save markdown report
   const mdPath = path.join(reportDir, `accuracy-report-${timestamp}.md`);
@@ -237,7 +236,7 @@ function generateReport(results, startTime) {
   fs.writeFileSync(mdPath, mdContent);
 
   // Save as latest
-  fs.writeFileSync(path.join(reportDir, 'latest-report.json'), JSON.stringify(report, null, 2));
+  fs.writeFileSync(path.join(reportDir, 'latest-report.json'), reportJson);
   fs.writeFileSync(path.join(reportDir, 'latest-report.md'), mdContent);
 
   return { report, jsonPath, mdPath };
@@ -339,11 +338,14 @@ async function main() {
       const { response, sources } = await sendQuery(question.query);
       const duration = Date.now() - queryStart;
 
+      // Lowercase once; both checks scan the same text
+      const lowerResponse = (response || '').toLowerCase();
+
       // Check keywords
-      const keywordCheck = checkKeywords(response, question.expected_keywords);
+      const keywordCheck = checkKeywords(lowerResponse, question.expected_keywords);
 
       // Check articles
-      const articleMatch = checkArticles(response, question.expected_articles);
+      const articleMatch = checkArticles(lowerResponse, question.expected_articles);
 
       // Determine pass/fail
       const isPassed = keywordCheck.accuracy >= 0.5 || question.expected_keywords.length === 0;
@@ -0,0 +1,61 @@
+/**
+ * Accuracy runner --resume tests
+ *
+ * Checks that results saved by an interrupted run are reloaded and that
+ * completed (model, question) pairs are not run again
+ *
+ * Run: npm run test:unit (Node only; no dev server or browser)
+ */
+
+import { test, expect } from '@playwright/test';
+import * as fs from 'fs';
+import * as os from 'os';
+import * as path from 'path';
+import { loadPartialResults, pendingQuestions } from '../../scripts/multi-model-accuracy-runner';
+
+type Question = Parameters<typeof pendingQuestions>[0][number];
+type Result = Parameters<typeof pendingQuestions>[2][number];
+
+const question = (id: string) => ({ id, query: `Question ${id}` }) as Question;
+const result = (model: string, questionId: string, error?: string) =>
+  ({ model, questionId, error }) as Result;
+
+function writePartial(lines: string[]): string {
+  const dir = fs.mkdtempSync(path.join(os.tmpdir(), 'accuracy-partial-'));
+  const filePath = path.join(dir, 'accuracy-results-partial.jsonl');
+  fs.writeFileSync(filePath, lines.join('\n'));
+  return filePath;
+}
+
+test.describe('Accuracy runner resume', () => {
+  test('loads completed results and drops errored or truncated lines', () => {
+    const filePath = writePartial([
+      JSON.stringify(result('gpt-4o-mini', 'q1')),
+      JSON.stringify(result('gpt-4o-mini', 'q2', 'HTTP 500: Internal Server Error')),
+      JSON.stringify(result('gpt-4o', 'q1')),
+      '{"model":"gpt-4o","questionId":"q2","resp', // Cut short by the interruption
+    ]);
+
+    const loaded = loadPartialResults(filePath);
+    expect(loaded.map(r => `${r.model}:${r.questionId}`)).toEqual(['gpt-4o-mini:q1', 'gpt-4o:q1']);
+  });
+
+  test('returns nothing when there is no partial file', () => {
+    expect(loadPartialResults(path.join(os.tmpdir(), 'no-such-partial.jsonl'))).toEqual([]);
+  });
+
+  test('skips completed (model, question) pairs on resume', () => {
+    const filePath = writePartial([
+      JSON.stringify(result('gpt-4o-mini', 'q1')),
+      JSON.stringify(result('gpt-4o-mini', 'q2', 'timeout')),
+      JSON.stringify(result('gpt-4o', 'q3')),
+    ]);
+    const questions = ['q1', 'q2', 'q3'].map(question);
+    const loaded = loadPartialResults(filePath);
+
+    // q1 is done for gpt-4o-mini only; the errored q2 runs again
+    expect(pendingQuestions(questions, 'gpt-4o-mini', loaded).map(q => q.id)).toEqual(['q2', 'q3']);
+    expect(pendingQuestions(questions, 'gpt-4o', loaded).map(q => q.id)).toEqual(['q1', 'q2']);
+    expect(pendingQuestions(questions, 'gpt-4-turbo', loaded).map(q => q.id)).toEqual(['q1', 'q2', 'q3']);
+  });
+});
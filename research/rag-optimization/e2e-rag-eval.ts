@@ -7,6 +7,8 @@ import { createClient } from '@supabase/supabase-js'
 import * as fs from 'fs'
 import * as path from 'path'
 import * as dotenv from 'dotenv'
+import { rpcWithRetry, RetryStats } from '../../scripts/fetch-with-retry'
+import { generateEmbeddings } from '../../scripts/openai-embeddings'
 
 dotenv.config({ path: path.resolve(__dirname, '../.env') })
 
@@ -22,6 +24,9 @@ const supabase = createClient(SUPABASE_URL, SUPABASE_KEY)
 
 // Test configuration
 const MAX_QUESTIONS = parseInt(process.env.E2E_MAX_QUESTIONS || '50')
+// Questions in flight at once. Response times are reported, so it defaults to
+// serial; raising it speeds up the run but inflates per-question responseTimeMs
+const CONCURRENCY = parseInt(process.env.E2E_CONCURRENCY || '1')
 const MIN_SIMILARITY = 0.25 // Optimized threshold
 const RESULTS_DIR = path.resolve(__dirname, 'eval_results')
 
@@ -35,6 +40,7 @@ interface QAPair {
   source_content: string
   topic: string
   complexity: string
+  source_chunk_set: Set<string> // source_chunk_ids as a set for O(1) lookups (set at load)
 }
 
 interface TestResult {
@@ -60,6 +66,8 @@ interface EvaluationReport {
     userEmail: string
     minSimilarity: number
     totalQuestions: number
+    embeddingBatchTimeMs: number // Question embeddings are generated up front, outside responseTimeMs
+    concurrency: number // Questions in flight while timing; > 1 inflates response times
     timestamp: string
   }
   summary: {
@@ -101,7 +109,11 @@ interface ComplexityStats {
 function loadQuestions(): QAPair[] {
   const dataPath = path.resolve(__dirname, 'eval_results/qa_pairs_dataset_v2.json')
   const data = JSON.parse(fs.readFileSync(dataPath, 'utf-8'))
-  return data.qa_pairs
+  const questions: QAPair[] = data.qa_pairs
+  for (const q of questions) {
+    q.source_chunk_set = new Set(q.source_chunk_ids)
+  }
+  return questions
 }
 
 // Sample questions by chunk_span distribution
@@ -126,23 +138,6 @@ function sampleQuestions(questions: QAPair[], maxCount: number): QAPair[] {
   return sampled.slice(0, maxCount)
 }
 
-// Generate embedding
-async function generateEmbedding(text: string): Promise<number[]> {
-  const response = await fetch('https://api.openai.com/v1/embeddings', {
-    method: 'POST',
-    headers: {
-      'Content-Type': 'application/json',
-      'Authorization': `Bearer ${OPENAI_API_KEY}`,
-    },
-    body: JSON.stringify({
-      model: 'text-embedding-3-small',
-      input: text.substring(0, 8000),
-    }),
-  })
-  const data = await response.json()
-  return data?.data?.[0]?.embedding || []
-}
-
 // Calculate cosine similarity
 function cosineSimilarity(a: number[], b: number[]): number {
   if (a.length !== b.length || a.length === 0) return 0
@@ -177,8 +172,9 @@ function calculateDocumentRecall(expected: string[], retrieved: string[]): numbe
 }
 
 // Run test for a single question
-async function testQuestion(q: QAPair): Promise<TestResult> {
+async function testQuestion(q: QAPair, embedding: string): Promise<TestResult> {
   const startTime = Date.now()
+  const retries: RetryStats = { waitMs: 0 } // Backoff sleeps, excluded from responseTimeMs
 
   const result: TestResult = {
     id: q.id,
@@ -198,70 +194,76 @@ async function testQuestion(q: QAPair): Promise<TestResult> {
   }
 
   try {
-    // Generate embedding for question
-    const embedding = await generateEmbedding(q.question)
-
     // Search using semantic_search RPC
-    const { data: chunks, error } = await supabase.rpc('semantic_search', {
-      query_embedding: JSON.stringify(embedding),
+    const { data: chunks, error } = await rpcWithRetry(() => supabase.rpc('semantic_search', {
+      query_embedding: embedding,
       p_user_id: USER_ID,
       match_count: 10,
       min_similarity: MIN_SIMILARITY,
-    })
+    }), retries)
 
-    result.responseTimeMs = Date.now() - startTime
+    result.responseTimeMs = Date.now() - startTime - retries.waitMs
 
     if (error) throw error
 
     if (chunks && chunks.length > 0) {
-      result.retrievedChunkIds = chunks.map((c: any) => c.chunk_id)
-      result.retrievedDocuments = [...new Set(chunks.map((c: any) => c.file_name))]
-
-      // Check if source chunk was found
+      // Single pass: chunk ids, documents, content, and first source-chunk rank
+      const retrievedDocuments = new Set<string>()
+      const contents: string[] = []
       for (let i = 0; i < chunks.length; i++) {
-        if (q.source_chunk_ids.includes(chunks[i].chunk_id)) {
+        const chunk = chunks[i]
+        result.retrievedChunkIds.push(chunk.chunk_id)
+        retrievedDocuments.add(chunk.file_name)
+        contents.push(chunk.content)
+        if (!result.chunkFound && q.source_chunk_set.has(chunk.chunk_id)) {
           result.chunkFound = true
           result.topChunkRank = i + 1
-          break
         }
       }
+      result.retrievedDocuments = [...retrievedDocuments]
 
       // Calculate document recall
       result.documentRecall = calculateDocumentRecall(q.source_documents, result.retrievedDocuments)
 
       // Calculate semantic similarity between expected answer and retrieved content
-      const retrievedContent = chunks.map((c: any) => c.content).join('\n\n').substring(0, 3000)
-      const [expectedEmb, retrievedEmb] = await Promise.all([
-        generateEmbedding(q.answer),
-        generateEmbedding(retrievedContent),
-      ])
+      const retrievedContent = contents.join('\n\n').substring(0, 3000)
+      const [expectedEmb, retrievedEmb] = await generateEmbeddings([q.answer, retrievedContent], OPENAI_API_KEY)
       result.semanticSimilarity = cosineSimilarity(expectedEmb, retrievedEmb)
     }
   } catch (err: any) {
-    console.error(`  Error: ${err.message}`)
-    result.responseTimeMs = Date.now() - startTime
+    console.error(`  Error (${q.id}): ${err.message}`)
+    result.responseTimeMs = Date.now() - startTime - retries.waitMs
   }
 
   return result
 }
 
 // Generate report from results
-function generateReport(results: TestResult[]): EvaluationReport {
+function generateReport(results: TestResult[], embeddingBatchTimeMs: number): EvaluationReport {
   const successful = results.filter(r => r.responseTimeMs > 0)
 
-  // Summary metrics
-  const avgResponseTime = successful.reduce((sum, r) => sum + r.responseTimeMs, 0) / successful.length
-  const avgSimilarity = successful.reduce((sum, r) => sum + r.semanticSimilarity, 0) / successful.length
-  const avgDocRecall = successful.reduce((sum, r) => sum + r.documentRecall, 0) / successful.length
-  const chunkFoundRate = successful.filter(r => r.chunkFound).length / successful.length
-  const rankedResults = successful.filter(r => r.topChunkRank !== null)
-  const avgTopChunkRank = rankedResults.length > 0
-    ? rankedResults.reduce((sum, r) => sum + (r.topChunkRank || 0), 0) / rankedResults.length
-    : 999
-
-  // Group by chunk_span
+  // Single pass: overall totals plus per-span/topic/complexity sums
+  let totalResponseTime = 0
+  let totalSimilarity = 0
+  let totalDocRecall = 0
+  let chunkFoundCount = 0
+  let rankSum = 0
+  let rankedCount = 0
   const byChunkSpan: Record<number, ChunkSpanStats> = {}
+  const byTopic: Record<string, TopicStats> = {}
+  const byComplexity: Record<string, ComplexityStats> = {}
+
   for (const r of successful) {
+    const found = r.chunkFound ? 1 : 0
+    totalResponseTime += r.responseTimeMs
+    totalSimilarity += r.semanticSimilarity
+    totalDocRecall += r.documentRecall
+    chunkFoundCount += found
+    if (r.topChunkRank !== null) {
+      rankSum += r.topChunkRank
+      rankedCount++
+    }
+
     if (!byChunkSpan[r.chunk_span]) {
       byChunkSpan[r.chunk_span] = { count: 0, avgSimilarity: 0, avgDocRecall: 0, chunkFoundRate: 0, avgResponseTime: 0 }
     }
@@ -269,20 +271,9 @@ function generateReport(results: TestResult[]): EvaluationReport {
     s.count++
     s.avgSimilarity += r.semanticSimilarity
     s.avgDocRecall += r.documentRecall
-    s.chunkFoundRate += r.chunkFound ? 1 : 0
+    s.chunkFoundRate += found
     s.avgResponseTime += r.responseTimeMs
-  }
-  for (const span of Object.keys(byChunkSpan)) {
-    const s = byChunkSpan[Number(span)]
-    s.avgSimilarity /= s.count
-    s.avgDocRecall /= s.count
-    s.chunkFoundRate /= s.count
-    s.avgResponseTime /= s.count
-  }
 
-  // Group by topic
-  const byTopic: Record<string, TopicStats> = {}
-  for (const r of successful) {
     if (!byTopic[r.topic]) {
       byTopic[r.topic] = { count: 0, avgSimilarity: 0, avgDocRecall: 0, chunkFoundRate: 0 }
     }
@@ -290,18 +281,8 @@ function generateReport(results: TestResult[]): EvaluationReport {
     t.count++
     t.avgSimilarity += r.semanticSimilarity
     t.avgDocRecall += r.documentRecall
-    t.chunkFoundRate += r.chunkFound ? 1 : 0
-  }
-  for (const topic of Object.keys(byTopic)) {
-    const t = byTopic[topic]
-    t.avgSimilarity /= t.count
-    t.avgDocRecall /= t.count
-    t.chunkFoundRate /= t.count
-  }
+    t.chunkFoundRate += found
 
-  // Group by complexity
-  const byComplexity: Record<string, ComplexityStats> = {}
-  for (const r of successful) {
     if (!byComplexity[r.complexity]) {
       byComplexity[r.complexity] = { count: 0, avgSimilarity: 0, avgDocRecall: 0, chunkFoundRate: 0 }
     }
@@ -309,13 +290,27 @@ function generateReport(results: TestResult[]): EvaluationReport {
     c.count++
     c.avgSimilarity += r.semanticSimilarity
     c.avgDocRecall += r.documentRecall
-    c.chunkFoundRate += r.chunkFound ? 1 : 0
+    c.chunkFoundRate += found
+  }
+
+  // Summary metrics
+  const avgResponseTime = totalResponseTime / successful.length
+  const avgSimilarity = totalSimilarity / successful.length
+  const avgDocRecall = totalDocRecall / successful.length
+  const chunkFoundRate = chunkFoundCount / successful.length
+  const avgTopChunkRank = rankedCount > 0 ? rankSum / rankedCount : 999
+
+  // Convert group sums to averages
+  for (const s of Object.values(byChunkSpan)) {
+    s.avgSimilarity /= s.count
+    s.avgDocRecall /= s.count
+    s.chunkFoundRate /= s.count
+    s.avgResponseTime /= s.count
   }
-  for (const complexity of Object.keys(byComplexity)) {
-    const c = byComplexity[complexity]
-    c.avgSimilarity /= c.count
-    c.avgDocRecall /= c.count
-    c.chunkFoundRate /= c.count
+  for (const g of [...Object.values(byTopic), ...Object.values(byComplexity)]) {
+    g.avgSimilarity /= g.count
+    g.avgDocRecall /= g.count
+    g.chunkFoundRate /= g.count
   }
 
   return {
@@ -324,6 +319,8 @@ function generateReport(results: TestResult[]): EvaluationReport {
       userEmail: USER_EMAIL,
       minSimilarity: MIN_SIMILARITY,
       totalQuestions: results.length,
+      embeddingBatchTimeMs,
+      concurrency: CONCURRENCY,
       timestamp: new Date().toISOString(),
     },
     summary: {
@@ -340,6 +337,23 @@ function generateReport(results: TestResult[]): EvaluationReport {
   }
 }
 
+// Write report to disk without building one string for the whole report:
+// the header sections are small, results are written one object per line
+function writeReport(filePath: string, report: EvaluationReport) {
+  const { results, ...header } = report
+  const fd = fs.openSync(filePath, 'w')
+  try {
+    const headerJson = JSON.stringify(header, null, 2)
+    fs.writeSync(fd, headerJson.slice(0, -2) + ',\n  "results": [\n')
+    results.forEach((r, i) => {
+      fs.writeSync(fd, '    ' + JSON.stringify(r) + (i < results.length - 1 ? ',\n' : '\n'))
+    })
+    fs.writeSync(fd, '  ]\n}\n')
+  } finally {
+    fs.closeSync(fd)
+  }
+}
+
 // Print report
 function printReport(report: EvaluationReport) {
   console.log('\n' + '='.repeat(80))
@@ -348,10 +362,14 @@ function printReport(report: EvaluationReport) {
   console.log(`User: ${report.config.userEmail}`)
   console.log(`Threshold: ${report.config.minSimilarity}`)
   console.log(`Questions: ${report.config.totalQuestions}`)
+  console.log(`Question embeddings: ${report.config.embeddingBatchTimeMs}ms (batched, excluded from response time)`)
 
   console.log('\n📊 SUMMARY')
   console.log('-'.repeat(50))
   console.log(`Avg Response Time:     ${report.summary.avgResponseTimeMs.toFixed(0)}ms`)
+  if (report.config.concurrency > 1) {
+    console.log(`⚠️  Measured with ${report.config.concurrency} questions in flight; calls competed for the same rate limits, so response times are inflated`)
+  }
   console.log(`Avg Semantic Similarity: ${(report.summary.avgSemanticSimilarity * 100).toFixed(1)}%`)
   console.log(`Avg Document Recall:   ${(report.summary.avgDocumentRecall * 100).toFixed(1)}%`)
   console.log(`Chunk Found Rate:      ${(report.summary.chunkFoundRate * 100).toFixed(1)}%`)
@@ -438,6 +456,7 @@ async function main() {
   console.log(`User: ${USER_EMAIL} (${USER_ID})`)
   console.log(`Threshold: ${MIN_SIMILARITY}`)
   console.log(`Max Questions: ${MAX_QUESTIONS}`)
+  console.log(`Concurrency: ${CONCURRENCY}`)
 
   // Load and sample questions
   const allQuestions = loadQuestions()
@@ -455,31 +474,45 @@ async function main() {
     console.log(`  chunk_span=${span}: ${count} questions`)
   }
 
-  // Run tests
-  console.log('\nRunning tests...\n')
-  const results: TestResult[] = []
-
-  for (let i = 0; i < questions.length; i++) {
-    const q = questions[i]
-    process.stdout.write(`[${(i + 1).toString().padStart(3)}/${questions.length}] ${q.id.padEnd(12)} `)
-
-    const result = await testQuestion(q)
-    results.push(result)
-
-    const status = result.chunkFound ? '✓' : '✗'
-    console.log(
-      `${status} sim=${(result.semanticSimilarity * 100).toFixed(0).padStart(3)}% ` +
-      `doc=${(result.documentRecall * 100).toFixed(0).padStart(3)}% ` +
-      `rank=${result.topChunkRank || '-'} ` +
-      `${result.responseTimeMs}ms`
-    )
-
-    // Rate limiting
-    await new Promise(resolve => setTimeout(resolve, 150))
+  // Embed every question up front in batched requests
+  console.log('\nGenerating question embeddings...')
+  const embeddingStart = Date.now()
+  const vectors = await generateEmbeddings(questions.map(q => q.question), OPENAI_API_KEY)
+  const embeddingBatchTimeMs = Date.now() - embeddingStart
+  // Serialized once per question; passed straight to the RPC
+  const embeddings: Map<string, string> = new Map()
+  questions.forEach((q, i) => embeddings.set(q.id, JSON.stringify(vectors[i])))
+  console.log(`Embeddings complete (${embeddingBatchTimeMs}ms)`)
+
+  // Run tests - each question is network-bound, so keep CONCURRENCY in flight
+  console.log(`\nRunning tests (concurrency ${CONCURRENCY})...\n`)
+  const results: TestResult[] = new Array(questions.length)
+  let next = 0
+  let completed = 0
+
+  async function worker() {
+    while (next < questions.length) {
+      const q = questions[next]
+      const index = next++
+      const result = await testQuestion(q, embeddings.get(q.id)!)
+      results[index] = result
+      completed++
+
+      const status = result.chunkFound ? '✓' : '✗'
+      console.log(
+        `[${completed.toString().padStart(3)}/${questions.length}] ${q.id.padEnd(12)} ` +
+        `${status} sim=${(result.semanticSimilarity * 100).toFixed(0).padStart(3)}% ` +
+        `doc=${(result.documentRecall * 100).toFixed(0).padStart(3)}% ` +
+        `rank=${result.topChunkRank || '-'} ` +
+        `${result.responseTimeMs}ms`
+      )
+    }
   }
 
+  await Promise.all(Array.from({ length: Math.min(CONCURRENCY, questions.length) }, worker))
+
   // Generate and print report
-  const report = generateReport(results)
+  const report = generateReport(results, embeddingBatchTimeMs)
   printReport(report)
 
   // Save results
@@ -488,7 +521,7 @@ async function main() {
   }
   const timestamp = new Date().toISOString().replace(/[:.]/g, '-')
   const resultsPath = path.join(RESULTS_DIR, `e2e_eval_${timestamp}.json`)
-  fs.writeFileSync(resultsPath, JSON.stringify(report, null, 2))
+  writeReport(resultsPath, report)
   console.log(`\n✅ Results saved to: ${resultsPath}`)
 }
 
@@ -7,6 +7,8 @@ import { createClient } from '@supabase/supabase-js'
 import * as fs from 'fs'
 import * as path from 'path'
 import * as dotenv from 'dotenv'
+import { rpcWithRetry, RetryStats } from '../../scripts/fetch-with-retry'
+import { generateEmbeddings } from '../../scripts/openai-embeddings'
 
 dotenv.config({ path: path.resolve(__dirname, '../.env') })
 
@@ -19,6 +21,7 @@ const supabase = createClient(SUPABASE_URL, SUPABASE_KEY)
 
 const MIN_SIMILARITY = 0.25
 const TOP_K_VALUES = [10, 20]
+const CONCURRENCY = parseInt(process.env.TOPK_CONCURRENCY || '8') // Questions in flight at once
 
 interface QAPair {
   id: string
@@ -29,6 +32,8 @@ interface QAPair {
   source_documents: string[]
   topic: string
   complexity: string
+  expected_docs: string[] // source_documents normalized for matching (set at load)
+  source_chunk_set: Set<string> // source_chunk_ids as a set for O(1) lookups (set at load)
 }
 
 interface TestResult {
@@ -40,11 +45,23 @@ interface TestResult {
   responseTimeMs: number
 }
 
+interface HitCounts {
+  total: number
+  chunkFound: number
+  docFound: number
+}
+
 // Load questions
 function loadQuestions(): QAPair[] {
   const dataPath = path.resolve(__dirname, 'eval_results/qa_pairs_dataset_v2.json')
   const data = JSON.parse(fs.readFileSync(dataPath, 'utf-8'))
-  return data.qa_pairs
+  const questions: QAPair[] = data.qa_pairs
+  // Precompute per-question lookups once, not on every testQuestion call
+  for (const q of questions) {
+    q.expected_docs = q.source_documents.map(d => d.toLowerCase().replace('.pdf', ''))
+    q.source_chunk_set = new Set(q.source_chunk_ids)
+  }
+  return questions
 }
 
 // Sample questions evenly by chunk_span
@@ -67,35 +84,19 @@ function sampleQuestions(questions: QAPair[], count: number): QAPair[] {
   return sampled.slice(0, count)
 }
 
-// Generate embedding
-async function generateEmbedding(text: string): Promise<number[]> {
-  const response = await fetch('https://api.openai.com/v1/embeddings', {
-    method: 'POST',
-    headers: {
-      'Content-Type': 'application/json',
-      'Authorization': `Bearer ${OPENAI_API_KEY}`,
-    },
-    body: JSON.stringify({
-      model: 'text-embedding-3-small',
-      input: text.substring(0, 8000),
-    }),
-  })
-  const data = await response.json()
-  return data?.data?.[0]?.embedding || []
-}
-
 // Test a question with specific top-k
-async function testQuestion(q: QAPair, topK: number, embedding: number[]): Promise<TestResult> {
+async function testQuestion(q: QAPair, topK: number, embedding: string): Promise<TestResult> {
   const startTime = Date.now()
+  const retries: RetryStats = { waitMs: 0 } // Backoff sleeps, excluded from responseTimeMs
 
-  const { data: chunks, error } = await supabase.rpc('semantic_search', {
-    query_embedding: JSON.stringify(embedding),
+  const { data: chunks, error } = await rpcWithRetry(() => supabase.rpc('semantic_search', {
+    query_embedding: embedding,
     p_user_id: USER_ID,
     match_count: topK,
     min_similarity: MIN_SIMILARITY,
-  })
+  }), retries)
 
-  const responseTimeMs = Date.now() - startTime
+  const responseTimeMs = Date.now() - startTime - retries.waitMs
 
   if (error || !chunks) {
     return {
@@ -112,18 +113,19 @@ async function testQuestion(q: QAPair, topK: number, embedding: number[]): Promi
   let chunkFound = false
   let chunkRank: number | null = null
   for (let i = 0; i < chunks.length; i++) {
-    if (q.source_chunk_ids.includes(chunks[i].chunk_id)) {
+    if (q.source_chunk_set.has(chunks[i].chunk_id)) {
       chunkFound = true
       chunkRank = i + 1
       break
     }
   }
 
-  // Check if source document was found
-  const retrievedDocs = chunks.map((c: any) => c.file_name.toLowerCase())
-  const expectedDocs = q.source_documents.map(d => d.toLowerCase().replace('.pdf', ''))
-  const docFound = expectedDocs.some(exp =>
-    retrievedDocs.some((ret: string) => ret.includes(exp) || exp.includes(ret.replace('.pdf', '')))
+  // Check if source document was found (chunks share files, so normalize
+  // each distinct file name once rather than per expected-doc comparison)
+  const retrievedDocs = [...new Set<string>(chunks.map((c: any) => c.file_name.toLowerCase()))]
+    .map(name => ({ name, stem: name.replace('.pdf', '') }))
+  const docFound = q.expected_docs.some(exp =>
+    retrievedDocs.some(ret => ret.name.includes(exp) || exp.includes(ret.stem))
   )
 
   return {
@@ -136,6 +138,23 @@ async function testQuestion(q: QAPair, topK: number, embedding: number[]): Promi
   }
 }
 
+// Count chunk/doc hits over a result list in one pass
+function countHits(results: TestResult[]): HitCounts {
+  const counts: HitCounts = { total: results.length, chunkFound: 0, docFound: 0 }
+  for (const r of results) {
+    if (r.chunkFound) counts.chunkFound++
+    if (r.docFound) counts.docFound++
+  }
+  return counts
+}
+
+// Add one group's counts into a running total
+function addHits(into: HitCounts, counts: HitCounts) {
+  into.total += counts.total
+  into.chunkFound += counts.chunkFound
+  into.docFound += counts.docFound
+}
+
 async function main() {
   console.log('=' .repeat(80))
   console.log('TOP-K COMPARISON TEST: 10 vs 20')
@@ -149,13 +168,10 @@ async function main() {
 
   // Pre-generate embeddings
   console.log('Generating embeddings...')
-  const embeddings: Map<string, number[]> = new Map()
-  for (let i = 0; i < questions.length; i++) {
-    const q = questions[i]
-    embeddings.set(q.id, await generateEmbedding(q.question))
-    if ((i + 1) % 10 === 0) console.log(`  Embedded ${i + 1}/${questions.length}`)
-    await new Promise(r => setTimeout(r, 100))
-  }
+  const vectors = await generateEmbeddings(questions.map(q => q.question), OPENAI_API_KEY)
+  // Serialized once per question; reused for every RPC below
+  const embeddings: Map<string, string> = new Map()
+  questions.forEach((q, i) => embeddings.set(q.id, JSON.stringify(vectors[i])))
   console.log('Embeddings complete.\n')
 
   // Results storage
@@ -169,36 +185,45 @@ async function main() {
   console.log('ID           | Span | K=10 Chunk | K=20 Chunk | K=10 Doc | K=20 Doc')
   console.log('-'.repeat(70))
 
-  for (const q of questions) {
-    const embedding = embeddings.get(q.id)!
-    const resultsByK: Record<number, TestResult> = {}
-
-    for (const topK of TOP_K_VALUES) {
-      const result = await testQuestion(q, topK, embedding)
-      resultsByK[topK] = result
-
-      if (!results[topK][q.chunk_span]) {
-        results[topK][q.chunk_span] = []
-      }
-      results[topK][q.chunk_span].push(result)
-
-      await new Promise(r => setTimeout(r, 50))
+  // Each question is network-bound, so keep CONCURRENCY in flight
+  let next = 0
+
+  async function worker() {
+    while (next < questions.length) {
+      const q = questions[next++]
+      const embedding = embeddings.get(q.id)!
+      const resultsByK: Record<number, TestResult> = {}
+
+      // The top-k variants are independent RPCs; issue them together
+      const resultsInOrder = await Promise.all(TOP_K_VALUES.map(topK => testQuestion(q, topK, embedding)))
+
+      TOP_K_VALUES.forEach((topK, i) => {
+        const result = resultsInOrder[i]
+        resultsByK[topK] = result
+
+        if (!results[topK][q.chunk_span]) {
+          results[topK][q.chunk_span] = []
+        }
+        results[topK][q.chunk_span].push(result)
+      })
+
+      // Print row
+      const r10 = resultsByK[10]
+      const r20 = resultsByK[20]
+      const improved = !r10.chunkFound && r20.chunkFound ? ' ⬆️' : ''
+      console.log(
+        `${q.id.padEnd(12)} | ` +
+        `${q.chunk_span.toString().padStart(4)} | ` +
+        `${r10.chunkFound ? `✓ rank=${r10.chunkRank}` : '✗'.padEnd(10)} | ` +
+        `${r20.chunkFound ? `✓ rank=${r20.chunkRank}` : '✗'.padEnd(10)} | ` +
+        `${r10.docFound ? '✓' : '✗'.padEnd(8)} | ` +
+        `${r20.docFound ? '✓' : '✗'}${improved}`
+      )
     }
-
-    // Print row
-    const r10 = resultsByK[10]
-    const r20 = resultsByK[20]
-    const improved = !r10.chunkFound && r20.chunkFound ? ' ⬆️' : ''
-    console.log(
-      `${q.id.padEnd(12)} | ` +
-      `${q.chunk_span.toString().padStart(4)} | ` +
-      `${r10.chunkFound ? `✓ rank=${r10.chunkRank}` : '✗'.padEnd(10)} | ` +
-      `${r20.chunkFound ? `✓ rank=${r20.chunkRank}` : '✗'.padEnd(10)} | ` +
-      `${r10.docFound ? '✓' : '✗'.padEnd(8)} | ` +
-      `${r20.docFound ? '✓' : '✗'}${improved}`
-    )
   }
 
+  await Promise.all(Array.from({ length: Math.min(CONCURRENCY, questions.length) }, worker))
+
   // Summary
   console.log('\n' + '=' .repeat(80))
   console.log('SUMMARY BY CHUNK SPAN')
@@ -210,18 +235,30 @@ async function main() {
   let totalImprovement = 0
   let totalQuestions = 0
 
+  // Overall and multi-document totals are summed from the per-span counts
+  const all10: HitCounts = { total: 0, chunkFound: 0, docFound: 0 }
+  const all20: HitCounts = { total: 0, chunkFound: 0, docFound: 0 }
+  const multiDoc10: HitCounts = { total: 0, chunkFound: 0, docFound: 0 }
+  const multiDoc20: HitCounts = { total: 0, chunkFound: 0, docFound: 0 }
+
   for (const span of spans) {
-    const r10 = results[10][span] || []
-    const r20 = results[20][span] || []
+    const c10 = countHits(results[10][span] || [])
+    const c20 = countHits(results[20][span] || [])
+    addHits(all10, c10)
+    addHits(all20, c20)
+    if (span > 1) {
+      addHits(multiDoc10, c10)
+      addHits(multiDoc20, c20)
+    }
 
-    const chunkFound10 = r10.filter(r => r.chunkFound).length / r10.length * 100
-    const chunkFound20 = r20.filter(r => r.chunkFound).length / r20.length * 100
-    const docFound10 = r10.filter(r => r.docFound).length / r10.length * 100
-    const docFound20 = r20.filter(r => r.docFound).length / r20.length * 100
+    const chunkFound10 = c10.chunkFound / c10.total * 100
+    const chunkFound20 = c20.chunkFound / c20.total * 100
+    const docFound10 = c10.docFound / c10.total * 100
+    const docFound20 = c20.docFound / c20.total * 100
 
     const improvement = chunkFound20 - chunkFound10
-    totalImprovement += improvement * r10.length
-    totalQuestions += r10.length
+    totalImprovement += improvement * c10.total
+    totalQuestions += c10.total
 
     console.log(
       `${span.toString().padStart(4)} | ` +
@@ -234,12 +271,10 @@ async function main() {
   }
 
   // Overall
-  const all10 = Object.values(results[10]).flat()
-  const all20 = Object.values(results[20]).flat()
-  const overallChunk10 = all10.filter(r => r.chunkFound).length / all10.length * 100
-  const overallChunk20 = all20.filter(r => r.chunkFound).length / all20.length * 100
-  const overallDoc10 = all10.filter(r => r.docFound).length / all10.length * 100
-  const overallDoc20 = all20.filter(r => r.docFound).length / all20.length * 100
+  const overallChunk10 = all10.chunkFound / all10.total * 100
+  const overallChunk20 = all20.chunkFound / all20.total * 100
+  const overallDoc10 = all10.docFound / all10.total * 100
+  const overallDoc20 = all20.docFound / all20.total * 100
 
   console.log('-'.repeat(80))
   console.log(
@@ -268,12 +303,9 @@ async function main() {
   }
 
   // Multi-doc specific analysis
-  const multiDocSpans = spans.filter(s => s > 1)
-  if (multiDocSpans.length > 0) {
-    const multiDoc10 = multiDocSpans.flatMap(s => results[10][s] || [])
-    const multiDoc20 = multiDocSpans.flatMap(s => results[20][s] || [])
-    const multi10Rate = multiDoc10.filter(r => r.chunkFound).length / multiDoc10.length * 100
-    const multi20Rate = multiDoc20.filter(r => r.chunkFound).length / multiDoc20.length * 100
+  if (spans.some(s => s > 1)) {
+    const multi10Rate = multiDoc10.chunkFound / multiDoc10.total * 100
+    const multi20Rate = multiDoc20.chunkFound / multiDoc20.total * 100
 
     console.log(`\nMulti-document questions (span > 1):`)
     console.log(`  K=10: ${multi10Rate.toFixed(0)}% chunk found`)
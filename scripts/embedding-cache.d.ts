@@ -0,0 +1,8 @@
+// Types for embedding-cache.js (kept as plain JS to match fetch-with-retry.js)
+
+export declare function cachedEmbeddings(
+  model: string,
+  dimensions: number, // Vector length for model; cached files of any other size are misses
+  texts: string[],
+  embed: (texts: string[]) => Promise<number[][]>
+): Promise<number[][]>
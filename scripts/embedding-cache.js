@@ -0,0 +1,59 @@
+/**
+ * On-disk embedding cache shared by the RAG eval scripts
+ *
+ * Each vector is stored as raw float32 bytes in a file named by
+ * sha256(model:text), so re-running an eval only embeds texts it has not
+ * seen before (set EMBEDDING_CACHE=off to disable). Files are written via a
+ * rename and checked against the model's dimension on read, so a partial or
+ * foreign file counts as a miss rather than a short vector
+ */
+
+const crypto = require('crypto')
+const fs = require('fs')
+const os = require('os')
+const path = require('path')
+
+const EMBEDDING_CACHE_DIR = process.env.EMBEDDING_CACHE_DIR || path.join(os.tmpdir(), 'rag-embedding-cache')
+const EMBEDDING_CACHE_ENABLED = process.env.EMBEDDING_CACHE !== 'off'
+
+function cachePath(model, text) {
+  const key = crypto.createHash('sha256').update(`${model}:${text}`).digest('hex')
+  return path.join(EMBEDDING_CACHE_DIR, `${key}.f32`)
+}
+
+function readVector(filePath, dimensions) {
+  if (!fs.existsSync(filePath)) return null
+  const buf = fs.readFileSync(filePath)
+  if (buf.length !== dimensions * 4) return null
+  return Array.from(new Float32Array(buf.buffer.slice(buf.byteOffset, buf.byteOffset + buf.length)))
+}
+
+function writeVector(filePath, vector) {
+  const tmpPath = `${filePath}.${process.pid}.tmp`
+  fs.writeFileSync(tmpPath, Buffer.from(vector.buffer))
+  fs.renameSync(tmpPath, filePath)
+}
+
+// Embeddings for texts, in order; embed() is called once with only the cache misses.
+// Fresh vectors are rounded to float32 too, so a cold and a warm run score identically
+async function cachedEmbeddings(model, dimensions, texts, embed) {
+  if (!EMBEDDING_CACHE_ENABLED) return embed(texts)
+
+  const paths = texts.map(text => cachePath(model, text))
+  const results = paths.map(filePath => readVector(filePath, dimensions))
+  const missing = []
+  results.forEach((vector, i) => { if (!vector) missing.push(i) })
+  if (missing.length === 0) return results
+
+  const fresh = await embed(missing.map(i => texts[i]))
+  fs.mkdirSync(EMBEDDING_CACHE_DIR, { recursive: true })
+  missing.forEach((i, j) => {
+    const vector = new Float32Array(fresh[j] || [])
+    results[i] = Array.from(vector)
+    // Failed items come back empty; leave them (and any odd-sized reply) uncached
+    if (vector.length === dimensions) writeVector(paths[i], vector)
+  })
+  return results
+}
+
+module.exports = { cachedEmbeddings }
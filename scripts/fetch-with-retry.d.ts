@@ -0,0 +1,14 @@
+// Types for fetch-with-retry.js (kept as plain JS so test-rag.js can require it)
+
+export interface RetryStats {
+  waitMs: number // Total time slept between attempts
+}
+
+export declare const MAX_RETRIES: number
+
+export declare function fetchWithRetry(url: string, init: RequestInit, stats?: RetryStats): Promise<Response>
+
+export declare function rpcWithRetry<T extends { error: unknown; status: number }>(
+  query: () => PromiseLike<T>,
+  stats?: RetryStats
+): Promise<T>
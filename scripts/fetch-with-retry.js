@@ -0,0 +1,61 @@
+/**
+ * Retry helpers shared by the RAG test and research scripts
+ *
+ * Transient failures (429, 5xx, dropped connections) are retried with jittered
+ * exponential backoff, or the server's Retry-After when it sends one. Time spent
+ * waiting is added to an optional stats object so callers can keep it out of
+ * latency figures.
+ */
+
+const MAX_RETRIES = 3 // Retries before giving up
+const MAX_DELAY_MS = 30000 // Cap on any single wait, including a server-supplied Retry-After
+
+function isRetryableStatus(status) {
+  // supabase-js reports a failed fetch (no HTTP response) as status 0
+  return status === 0 || status === 429 || status >= 500
+}
+
+function retryDelayMs(attempt, retryAfterHeader) {
+  const retryAfter = Number(retryAfterHeader)
+  if (retryAfter > 0) return Math.min(retryAfter * 1000, MAX_DELAY_MS)
+  return Math.min(500 * 2 ** attempt, MAX_DELAY_MS) + Math.random() * 500
+}
+
+async function waitForRetry(delayMs, stats) {
+  await new Promise(r => setTimeout(r, delayMs))
+  if (stats) stats.waitMs += delayMs
+}
+
+// fetch() with retries on 429/5xx and network errors; once retries run out,
+// returns the last response or rethrows the last network error
+async function fetchWithRetry(url, init, stats) {
+  for (let attempt = 0; ; attempt++) {
+    let response
+    try {
+      response = await fetch(url, init)
+    } catch (error) {
+      // fetch rejects with a TypeError when the connection fails (ECONNRESET,
+      // socket hang up); anything else, such as an abort, is not retried
+      if (attempt >= MAX_RETRIES || !(error instanceof TypeError)) throw error
+      await waitForRetry(retryDelayMs(attempt, null), stats)
+      continue
+    }
+    if (attempt >= MAX_RETRIES || !isRetryableStatus(response.status)) return response
+    const delayMs = retryDelayMs(attempt, response.headers.get('retry-after'))
+    // Release the failed response's connection before sending the next attempt
+    await response.body?.cancel()
+    await waitForRetry(delayMs, stats)
+  }
+}
+
+// Supabase query (e.g. an rpc() call) with the same policy. supabase-js resolves
+// with { error, status } instead of throwing, so the status decides the retry
+async function rpcWithRetry(query, stats) {
+  for (let attempt = 0; ; attempt++) {
+    const result = await query()
+    if (!result.error || attempt >= MAX_RETRIES || !isRetryableStatus(result.status)) return result
+    await waitForRetry(retryDelayMs(attempt, null), stats)
+  }
+}
+
+module.exports = { MAX_RETRIES, fetchWithRetry, rpcWithRetry }
@@ -0,0 +1,7 @@
+// Types for llm-cache.js (kept as plain JS so test-rag.js can require it)
+
+export declare function cachedChat(
+  cacheDir: string,
+  body: string,
+  send: (body: string) => Promise<string>
+): Promise<string>
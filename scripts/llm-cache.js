@@ -0,0 +1,47 @@
+/**
+ * On-disk chat completion cache shared by the RAG test scripts
+ *
+ * Replies are stored as text files named by sha256 of the request body, so a
+ * replayed request skips the API (set LLM_CACHE=off to disable). Identical
+ * requests made while one is still in flight share that call either way.
+ */
+
+const crypto = require('crypto')
+const fs = require('fs')
+const path = require('path')
+
+const LLM_CACHE_ENABLED = process.env.LLM_CACHE !== 'off'
+
+// Requests currently awaiting a reply, keyed by cache file path
+const inflight = new Map()
+
+async function requestAndStore(body, cachePath, send) {
+  const content = await send(body)
+  if (LLM_CACHE_ENABLED && content) {
+    fs.mkdirSync(path.dirname(cachePath), { recursive: true })
+    // Write then rename, so a crash or a parallel run never leaves a partial reply
+    const tmpPath = `${cachePath}.${process.pid}.tmp`
+    fs.writeFileSync(tmpPath, content)
+    fs.renameSync(tmpPath, cachePath)
+  }
+  return content
+}
+
+// Reply for a serialized chat request: from cacheDir, from an identical request
+// already in flight, or from send(body); empty replies are not stored
+function cachedChat(cacheDir, body, send) {
+  const key = crypto.createHash('sha256').update(body).digest('hex')
+  const cachePath = path.join(cacheDir, `${key}.txt`)
+  if (LLM_CACHE_ENABLED && fs.existsSync(cachePath)) {
+    return Promise.resolve(fs.readFileSync(cachePath, 'utf-8'))
+  }
+
+  let pending = inflight.get(cachePath)
+  if (!pending) {
+    pending = requestAndStore(body, cachePath, send).finally(() => inflight.delete(cachePath))
+    inflight.set(cachePath, pending)
+  }
+  return pending
+}
+
+module.exports = { cachedChat }
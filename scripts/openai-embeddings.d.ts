@@ -0,0 +1,5 @@
+// Types for openai-embeddings.js (kept as plain JS to match embedding-cache.js)
+
+export declare const EMBEDDING_MODEL: string
+
+export declare function generateEmbeddings(texts: string[], apiKey: string): Promise<number[][]>
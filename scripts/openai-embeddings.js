@@ -0,0 +1,47 @@
+/**
+ * Batched OpenAI embeddings for the RAG research scripts
+ *
+ * Requests go out in batches (the endpoint accepts an array input) with the
+ * shared retry policy, and only texts missing from the on-disk cache are sent
+ */
+
+const { cachedEmbeddings } = require('./embedding-cache')
+const { fetchWithRetry } = require('./fetch-with-retry')
+
+const EMBEDDING_MODEL = 'text-embedding-3-small'
+const EMBEDDING_DIMENSIONS = 1536 // Output size of EMBEDDING_MODEL
+const EMBEDDING_URL = 'https://api.openai.com/v1/embeddings'
+const EMBEDDING_BATCH_SIZE = 100 // Inputs per embeddings request
+
+async function requestEmbeddings(texts, apiKey) {
+  const embeddings = []
+  for (let i = 0; i < texts.length; i += EMBEDDING_BATCH_SIZE) {
+    const batch = texts.slice(i, i + EMBEDDING_BATCH_SIZE)
+    const response = await fetchWithRetry(EMBEDDING_URL, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Authorization': `Bearer ${apiKey}`,
+      },
+      body: JSON.stringify({
+        model: EMBEDDING_MODEL,
+        input: batch.map(text => text.substring(0, 8000)),
+      }),
+    })
+    const data = await response.json()
+    // Each item carries its input index; order by it to stay aligned
+    const items = [...(data?.data || [])].sort((a, b) => a.index - b.index)
+    embeddings.push(...batch.map((_, j) => items[j]?.embedding || []))
+    if (texts.length > EMBEDDING_BATCH_SIZE) {
+      console.log(`  Embedded ${Math.min(i + EMBEDDING_BATCH_SIZE, texts.length)}/${texts.length}`)
+    }
+  }
+  return embeddings
+}
+
+// Embeddings for texts in input order, reusing vectors cached on disk by earlier runs
+function generateEmbeddings(texts, apiKey) {
+  return cachedEmbeddings(EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, texts, batch => requestEmbeddings(batch, apiKey))
+}
+
+module.exports = { EMBEDDING_MODEL, generateEmbeddings }
@@ -0,0 +1,22 @@
+// Types for rag-judge.js (kept as plain JS so test-rag.js can require it)
+
+export interface JudgeScores {
+  groundedness: number
+  relevance: number
+}
+
+export type ChatFn = (
+  prompt: string,
+  systemPrompt?: string,
+  jsonMode?: boolean,
+  maxTokens?: number
+) => Promise<string>
+
+export declare function parseJudgeScores(response: string): JudgeScores | null
+
+export declare function evaluateAnswer(
+  callLLM: ChatFn,
+  question: string,
+  answer: string,
+  sources: string[]
+): Promise<JudgeScores>
@@ -0,0 +1,73 @@
+/**
+ * LLM judge shared by the RAG test scripts
+ *
+ * Scores groundedness and chunk relevance in one JSON-mode call (both read the
+ * same sources), validates the reply, and retries once with a format reminder
+ */
+
+const JUDGE_MAX_TOKENS = 50 // The judge returns only two integer scores
+const JUDGE_RETRY_NOTE = '\n\nYour previous reply did not match this format. Reply with only the JSON object.'
+
+function judgePrompt(question, answer, sources) {
+  return `You are an evaluator. Score the answer and the retrieved source documents below.
+
+Question: ${question}
+
+Answer: ${answer}
+
+Source Documents:
+${sources.map((c, i) => `[${i+1}] ${c}`).join('\n---\n')}
+
+1. groundedness - how well the answer is grounded in the source documents (0-100):
+- 100: Answer is completely supported by sources with direct quotes
+- 75: Answer is well supported with minor inferences
+- 50: Answer is partially supported
+- 25: Answer makes claims not in sources
+- 0: Answer contradicts or ignores sources
+
+2. relevance - how relevant the source documents are to answering the question (0-100):
+- 100: All chunks directly answer the question
+- 75: Most chunks are relevant
+- 50: Some chunks are relevant
+- 25: Few chunks are relevant
+- 0: No chunks are relevant
+
+Return ONLY JSON: {"groundedness": <number>, "relevance": <number>}`
+}
+
+// Read the judge's scores, or null if the reply isn't {"groundedness": n, "relevance": n}
+function parseJudgeScores(response) {
+  let parsed
+  try {
+    // JSON mode returns the object as-is; slice out the braces only if it didn't
+    parsed = JSON.parse(response)
+  } catch (e) {
+    try {
+      parsed = JSON.parse(response.slice(response.indexOf('{'), response.lastIndexOf('}') + 1))
+    } catch (e) {
+      return null
+    }
+  }
+
+  const groundedness = parseInt(parsed?.groundedness)
+  const relevance = parseInt(parsed?.relevance)
+  if (isNaN(groundedness) || isNaN(relevance)) return null
+
+  const clamp = score => Math.min(100, Math.max(0, score))
+  return { groundedness: clamp(groundedness), relevance: clamp(relevance) }
+}
+
+// Judge an answer against its sources; callLLM is the script's
+// (prompt, systemPrompt, jsonMode, maxTokens) chat helper
+async function evaluateAnswer(callLLM, question, answer, sources) {
+  const prompt = judgePrompt(question, answer, sources)
+  const scores = parseJudgeScores(await callLLM(prompt, undefined, true, JUDGE_MAX_TOKENS))
+    // One corrective retry; the changed prompt also bypasses the cached reply
+    ?? parseJudgeScores(await callLLM(prompt + JUDGE_RETRY_NOTE, undefined, true, JUDGE_MAX_TOKENS))
+  if (!scores) {
+    console.error('    ⚠️ Judge reply did not match the expected scores; using neutral scores')
+  }
+  return scores ?? { groundedness: 50, relevance: 50 }
+}
+
+module.exports = { evaluateAnswer, parseJudgeScores }
@@ -4,7 +4,11 @@
  */
 
 const fs = require('fs')
+const os = require('os')
 const path = require('path')
+const { fetchWithRetry } = require('./fetch-with-retry')
+const { cachedChat } = require('./llm-cache')
+const { evaluateAnswer } = require('./rag-judge')
 
 // Configuration
 const EMBEDDING_MODEL = 'text-embedding-3-small'
@@ -12,6 +16,9 @@ const OPENAI_EMBEDDING_URL = 'https://api.openai.com/v1/embeddings'
 const LLM_API_URL = 'https://apps.abacus.ai/v1/chat/completions'
 const OPENAI_API_KEY = process.env.OPENAI_API_KEY
 const ABACUSAI_API_KEY = process.env.ABACUSAI_API_KEY
+const EVAL_CONCURRENCY = parseInt(process.env.EVAL_CONCURRENCY || '4') // Questions judged at once
+// Chat responses keyed by request hash; replays skip the API (set LLM_CACHE=off to disable)
+const LLM_CACHE_DIR = process.env.LLM_CACHE_DIR || path.join(os.tmpdir(), 'rag-test-llm-cache')
 
 if (!OPENAI_API_KEY) {
   console.error('Error: OPENAI_API_KEY environment variable is required')
@@ -19,8 +26,8 @@ if (!OPENAI_API_KEY) {
 }
 
 // Helper: Generate embedding using OpenAI
-async function generateEmbedding(text) {
-  const response = await fetch(OPENAI_EMBEDDING_URL, {
+async function generateEmbedding(text, retries) {
+  const response = await fetchWithRetry(OPENAI_EMBEDDING_URL, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
@@ -30,7 +37,7 @@ async function generateEmbedding(text) {
       model: EMBEDDING_MODEL,
       input: text.substring(0, 8000 * 4),
     }),
-  })
+  }, retries)
 
   if (!response.ok) {
     const err = await response.text()
@@ -41,23 +48,15 @@ async function generateEmbedding(text) {
   return data?.data?.[0]?.embedding || []
 }
 
-// Helper: Call LLM
-async function callLLM(prompt, systemPrompt) {
-  const messages = []
-  if (systemPrompt) messages.push({ role: 'system', content: systemPrompt })
-  messages.push({ role: 'user', content: prompt })
-
-  const response = await fetch(LLM_API_URL, {
+// Helper: POST a prepared chat completion body and return the reply text
+async function requestLLM(body) {
+  const response = await fetchWithRetry(LLM_API_URL, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
       'Authorization': `Bearer ${ABACUSAI_API_KEY}`,
     },
-    body: JSON.stringify({
-      model: 'gpt-4o-mini',
-      messages,
-      max_tokens: 2000,
-    }),
+    body,
   })
 
   if (!response.ok) {
@@ -69,6 +68,24 @@ async function callLLM(prompt, systemPrompt) {
   return data?.choices?.[0]?.message?.content || ''
 }
 
+// Helper: Call LLM (jsonMode asks the API for a bare JSON object)
+function callLLM(prompt, systemPrompt, jsonMode = false, maxTokens = 2000) {
+  const messages = []
+  if (systemPrompt) messages.push({ role: 'system', content: systemPrompt })
+  messages.push({ role: 'user', content: prompt })
+
+  const body = JSON.stringify({
+    model: 'gpt-4o-mini',
+    messages,
+    max_tokens: maxTokens,
+    ...(jsonMode && { response_format: { type: 'json_object' } }),
+  })
+
+  // Identical requests (same model, messages, limits) return the stored response,
+  // and concurrent callers with the same request share one API call
+  return cachedChat(LLM_CACHE_DIR, body, requestLLM)
+}
+
 // Helper: Extract text from PDF
 async function extractTextFromPDF(filePath) {
   const { PDFParse } = require('pdf-parse')
@@ -173,7 +190,6 @@ async function runTest() {
     } catch (e) {
       console.error(`\n  ❌ Error embedding chunk ${i}: ${e.message}`)
     }
-    await new Promise(r => setTimeout(r, 200))
   }
   console.log('\n  ✅ Embeddings generated')
 
@@ -231,9 +247,10 @@ Return ONLY a JSON array:
     console.log(`\n  Testing Q${i+1}: "${qa.question.substring(0, 50)}..."`)
 
     const startTime = Date.now()
+    const retries = { waitMs: 0 } // Backoff sleeps, excluded from retrieval time
 
     try {
-      const queryEmbedding = await generateEmbedding(qa.question)
+      const queryEmbedding = await generateEmbedding(qa.question, retries)
 
       // Find top similar chunks
       const similarities = chunkEmbeddings.map(ce => ({
@@ -243,7 +260,7 @@ Return ONLY a JSON array:
       similarities.sort((a, b) => b.similarity - a.similarity)
       const topChunks = similarities.slice(0, 3)
 
-      const retrievalTime = Date.now() - startTime
+      const retrievalTime = Date.now() - startTime - retries.waitMs
       totalRetrievalTime += retrievalTime
 
       console.log(`    Top similarity: ${topChunks[0]?.similarity.toFixed(4)}`)
@@ -258,8 +275,6 @@ Return ONLY a JSON array:
     } catch (e) {
       console.error(`    ❌ Error: ${e.message}`)
     }
-
-    await new Promise(r => setTimeout(r, 300))
   }
 
   metrics.retrieval.queryCount = retrievalResults.length
@@ -269,48 +284,40 @@ Return ONLY a JSON array:
   console.log('\n📊 STEP 4: Evaluate Quality')
   console.log('-'.repeat(40))
 
-  const groundednessScores = []
-  const relevanceScores = []
-
-  for (let i = 0; i < retrievalResults.length; i++) {
-    const result = retrievalResults[i]
-    console.log(`\n  Evaluating Q${i+1}...`)
-
-    // Generate RAG answer
-    const ragContext = result.retrievedChunks.join('\n\n---\n\n')
-    const ragAnswer = await callLLM(
-      `Based on these documents, answer: ${result.question}\n\nDocuments:\n${ragContext.substring(0, 3000)}`,
-      'Answer based ONLY on the provided documents. Be concise.'
-    )
-
-    // Evaluate groundedness (simplified)
-    const groundednessPrompt = `Rate 0-100: How grounded is this answer in the source?
-Question: ${result.question}
-Answer: ${ragAnswer}
-Source: ${ragContext.substring(0, 1500)}
-Return ONLY a number.`
-
-    const groundednessResp = await callLLM(groundednessPrompt)
-    const groundedness = parseInt(groundednessResp) || 50
-    groundednessScores.push(Math.min(100, Math.max(0, groundedness)))
-
-    // Evaluate relevance
-    const relevancePrompt = `Rate 0-100: How relevant are these chunks to the question?
-Question: ${result.question}
-Chunks: ${ragContext.substring(0, 1500)}
-Return ONLY a number.`
-
-    const relevanceResp = await callLLM(relevancePrompt)
-    const relevance = parseInt(relevanceResp) || 50
-    relevanceScores.push(Math.min(100, Math.max(0, relevance)))
-
-    console.log(`    Groundedness: ${groundednessScores[i]}`)
-    console.log(`    Relevance: ${relevanceScores[i]}`)
-    console.log(`    RAG Answer: ${ragAnswer.substring(0, 100)}...`)
-
-    await new Promise(r => setTimeout(r, 500))
+  const groundednessScores = new Array(retrievalResults.length)
+  const relevanceScores = new Array(retrievalResults.length)
+
+  // Each question is network-bound, so keep EVAL_CONCURRENCY in flight
+  let next = 0
+
+  async function worker() {
+    while (next < retrievalResults.length) {
+      const i = next++
+      const result = retrievalResults[i]
+
+      // Generate RAG answer
+      const ragContext = result.retrievedChunks.join('\n\n---\n\n')
+      const ragAnswer = await callLLM(
+        `Based on these documents, answer: ${result.question}\n\nDocuments:\n${ragContext.substring(0, 3000)}`,
+        'Answer based ONLY on the provided documents. Be concise.'
+      )
+
+      // Evaluate groundedness and relevance (simplified)
+      const { groundedness, relevance } = await evaluateAnswer(callLLM, result.question, ragAnswer, [ragContext.substring(0, 1500)])
+      groundednessScores[i] = groundedness
+      relevanceScores[i] = relevance
+
+      console.log(
+        `\n  Evaluated Q${i+1}:\n` +
+        `    Groundedness: ${groundednessScores[i]}\n` +
+        `    Relevance: ${relevanceScores[i]}\n` +
+        `    RAG Answer: ${ragAnswer.substring(0, 100)}...`
+      )
+    }
   }
 
+  await Promise.all(Array.from({ length: Math.min(EVAL_CONCURRENCY, retrievalResults.length) }, worker))
+
   // Calculate final metrics
   metrics.quality.groundedness = groundednessScores.reduce((a, b) => a + b, 0) / groundednessScores.length
   metrics.quality.relevance = relevanceScores.reduce((a, b) => a + b, 0) / relevanceScores.length